@@ -2,8 +2,9 @@
 
 import logging
 import random
+import weakref
 
-from struct import pack, unpack
+from struct import Struct, pack, unpack
 from typing import (Any, Callable, Dict, List, Sequence)  # NOQA pylint: disable=W0611
 from typing import (Tuple, Union, Optional, Iterator)  # NOQA pylint: disable=W0611
 
@@ -11,10 +12,34 @@ import bluepy.btle
 import tenacity
 
 from . import constants
-from .utils import prepare_tlv, iterate_tvl, HapBleError, parse_ktlvs
+from .utils import (prepare_tlv, prepare_tlvs, iterate_tvl, HapBleError,
+                    parse_ktlvs)
 
 logger = logging.getLogger(__name__)
 
+# Precompiled header structs, to avoid re-parsing the format string
+# on every PDU build.
+_CONTINUATION_HEADER_STRUCT = Struct('<BB')
+_REQUEST_HEADER_STRUCT = Struct('<BBB')
+# Instance IDs are uint16 per the spec, so most headers are exactly 5
+# bytes and can be packed in a single call.
+_REQUEST_HEADER_CID16_STRUCT = Struct('<BBB2s')
+_BODY_LENGTH_STRUCT = Struct('<H')
+
+# Hoisted copies of the hot op and status codes, so the request path does
+# a single global load instead of chained attribute lookups.
+_SIGNATURE_READ_OP_CODE = constants.HapBleOpCodes.Characteristic_Signature_Read
+_SUCCESS_STATUS_CODE = constants.HapBleStatusCodes.Success
+
+# Cache of discovered characteristic IDs, keyed by peripheral address and
+# characteristic handle. Descriptor discovery takes several BLE round trips,
+# and the IDs do not change across reconnects.
+_cid_cache = {}  # type: Dict[Tuple[str, int], bytes]
+
+# Shared generator for transaction identifiers. Instantiating SystemRandom
+# per header would open the system entropy source every time.
+_system_random = random.SystemRandom()
+
 
 class HapBlePduHeader:
     """Interface for HAP-BLE Headers.
@@ -39,14 +64,12 @@ class HapBlePduHeader:
     @property
     def control_field(self) -> int:
         """Get Control Field as int."""
-        return int(self.control_field_bits, 2)
+        return (int(self.continuation) << 7) | (int(self.response) << 1)
 
     @property
     def control_field_bits(self) -> str:
         """Get Control Field as string of bits."""
-        control_field_str = "{continuation}00000{response}0".format(
-            continuation=int(self.continuation), response=int(self.response))
-        return control_field_str
+        return format(self.control_field, '08b')
 
     @property
     def data(self) -> bytes:
@@ -86,12 +109,23 @@ class HapBlePduRequestHeader(HapBlePduHeader):
                  response: bool=False,
                  continuation: bool=False,
                  transaction_id: int=None) -> None:
+        self._data = None  # type: Optional[bytes]
         super(HapBlePduRequestHeader, self).__init__(
             response=response, continuation=continuation)
         self.op_code = op_code
         self._transaction_id = transaction_id
         self.cid_sid = cid_sid
 
+    @property
+    def continuation(self) -> bool:
+        """Fragmentation status of the HAP-BLE PDU."""
+        return self._continuation
+
+    @continuation.setter
+    def continuation(self, value: bool) -> None:
+        self._continuation = value
+        self._data = None
+
     @property
     def transaction_id(self) -> int:
         """Get the transaction identifier, or generate a new one if none exists.
@@ -101,18 +135,32 @@ class HapBlePduRequestHeader(HapBlePduHeader):
         of the request and is used to match a request/response pair.
         """
         if self._transaction_id is None:
-            self._transaction_id = random.SystemRandom().getrandbits(8)
+            self._transaction_id = _system_random.getrandbits(8)
         return self._transaction_id
 
     @property
     def data(self) -> bytes:
         """Byte representation of the PDU Header.
 
-        Depends on whether it is a continuation header or not."""
-        if self.continuation:
-            return pack('<BB', self.control_field, self.transaction_id)
-        return pack('<BBB', self.control_field, self.op_code,
-                    self.transaction_id) + self.cid_sid
+        Depends on whether it is a continuation header or not.
+        Cached after the first access, since the header fields are
+        fixed once built."""
+        if self._data is None:
+            if self.continuation:
+                self._data = _CONTINUATION_HEADER_STRUCT.pack(
+                    self.control_field, self.transaction_id)
+            elif len(self.cid_sid) == 2:
+                self._data = _REQUEST_HEADER_CID16_STRUCT.pack(
+                    self.control_field, self.op_code, self.transaction_id,
+                    self.cid_sid)
+            else:
+                buf = bytearray(3 + len(self.cid_sid))
+                _REQUEST_HEADER_STRUCT.pack_into(buf, 0, self.control_field,
+                                                 self.op_code,
+                                                 self.transaction_id)
+                buf[3:] = self.cid_sid
+                self._data = bytes(buf)
+        return self._data
 
     def __str__(self) -> str:
         return super(HapBlePduRequestHeader, self).__str__(
@@ -241,7 +289,12 @@ class HapCharacteristic:
                  retry_max_attempts: int=1,
                  retry_wait_time: int=2) -> None:
         self.uuid = uuid
-        self.accessory = accessory
+        # Weak back-reference, so characteristics cached past a connection
+        # do not keep the accessory (and its peripheral) alive.
+        if isinstance(accessory, weakref.ProxyTypes):
+            self.accessory = accessory
+        else:
+            self.accessory = weakref.proxy(accessory)
         self.retry = retry
         self.retry_max_attempts = retry_max_attempts
         self.retry_wait_time = retry_wait_time
@@ -249,6 +302,7 @@ class HapCharacteristic:
         self._cid = None  # type: Optional[bytes]
         self.hap_format_converter = constants.identity
         self._signature = None  # type: Optional[Dict[str, Any]]
+        self._retry_params = None  # type: Optional[Tuple[int, int]]
 
         if self.retry:
             self._setup_tenacity(
@@ -313,8 +367,7 @@ class HapCharacteristic:
 
         while True:
             logger.debug("Preparing message with kTLVs: %s", kTLVs)
-            prepared_ktlvs = b''.join(
-                data for ktlv in kTLVs for data in prepare_tlv(*ktlv))
+            prepared_ktlvs = prepare_tlvs(kTLVs)
 
             TLVs = [(constants.HapParamTypes.Return_Response, pack('<B', 1)),
                     (constants.HapParamTypes.Value, prepared_ktlvs)]
@@ -360,19 +413,22 @@ class HapCharacteristic:
         return response_parsed
 
     def _setup_tenacity(self, max_attempts: int, wait_time: int) -> None:
-        """Adds automatic retrying to functions that need to read from device."""
-        reconnect_callback = reconnect_callback_factory(
-            accessory=self.accessory)
+        """Adds automatic retrying to functions that need to read from device.
 
-        retry = reconnect_tenacity_retry(reconnect_callback, max_attempts,
-                                         wait_time)
+        The retry decorator is built and applied once; repeated calls with
+        the same parameters are no-ops so the methods are never wrapped
+        twice."""
+        if self._retry_params == (max_attempts, wait_time):
+            return
+        self._retry_params = (max_attempts, wait_time)
 
-        retry_functions = [
-            self._read_cid, self._request, self._read, self._characteristic
-        ]
+        retry = self.accessory.tenacity_retry(max_attempts, wait_time)
+
+        retry_functions = (self._read_cid, self._request, self._read)
 
         for func in retry_functions:
             name = func.__name__
+            logger.debug("Wrapping %s with retry.", name)
             setattr(self, name, retry(func))
 
     @property
@@ -393,17 +449,26 @@ class HapCharacteristic:
         if self._signature is None:
             signature_read_header = HapBlePduRequestHeader(
                 cid_sid=self.cid,
-                op_code=constants.HapBleOpCodes.Characteristic_Signature_Read,
+                op_code=_SIGNATURE_READ_OP_CODE,
             )
             self._signature = self.read(signature_read_header)
         return self._signature
 
     def _read_cid(self) -> bytes:
-        """Read the Characteristic ID descriptor."""
+        """Read the Characteristic ID descriptor.
+
+        Reuses previously discovered IDs, to avoid descriptor
+        discovery round trips on reconnect."""
+        key = (self.accessory.address, self._characteristic.getHandle())
+        if key in _cid_cache:
+            logger.debug("Characteristic ID found in cache.")
+            return _cid_cache[key]
         logger.debug("Read characteristic ID descriptor.")
         cid_descriptor = self._characteristic.getDescriptors(
             constants.characteristic_ID_descriptor_UUID)[0]
-        return cid_descriptor.read()
+        cid = cid_descriptor.read()
+        _cid_cache[key] = cid
+        return cid
 
     @staticmethod
     def _check_read_response(request_header: HapBlePduRequestHeader,
@@ -419,14 +484,14 @@ class HapCharacteristic:
             raise ValueError("Invalid transaction ID {}, expected {}.".format(
                 response_header.transaction_id, request_header.transaction_id),
                              response)
-        if response_header.status_code != constants.HapBleStatusCodes.Success:
+        if response_header.status_code != _SUCCESS_STATUS_CODE:
             raise HapBleError(status_code=response_header.status_code)
 
         if len(response) > 3:
-            body_length = unpack('<H', response[3:5])[0]
-            if len(response[5:]) != body_length:
+            body_length = _BODY_LENGTH_STRUCT.unpack_from(response, 3)[0]
+            if len(response) - 5 != body_length:
                 raise ValueError("Invalid body length {}, expected {}.".format(
-                    len(response[5:]), body_length), response)
+                    len(response) - 5, body_length), response)
 
         return response_header
 
@@ -438,21 +503,37 @@ class HapCharacteristic:
         for body_type, length, bytes_ in iterate_tvl(response[5:]):
             if len(bytes_) != length:
                 raise HapBleError(name="Invalid response length")
-            name = constants.HAP_param_type_code_to_name[body_type]
+            # The converters and attribute values need real bytes
+            bytes_ = bytes(bytes_)
+            if not 0 < body_type < len(constants.HAP_param_table):
+                raise HapBleError(
+                    name="Unknown parameter type",
+                    message="Parameter type code {}".format(body_type))
+            name, converter = constants.HAP_param_table[body_type]
 
             if name in ('GATT_Valid_Range', 'HAP_Step_Value_Descriptor',
                         'Value'):
-                converter = self.hap_format_converter
-            else:
-                converter = constants.HAP_param_name_to_converter[name]
+                # The format descriptor TLV may have been parsed earlier
+                # in this same response, in which case its converter is
+                # still in the local dict rather than on self.
+                converter = attributes.get('hap_format_converter',
+                                           self.hap_format_converter)
 
             # Treat GATT_Presentation_Format_Descriptor specially
             if name == 'GATT_Presentation_Format_Descriptor':
                 format_code, unit_code = converter(bytes_)
-                format_name = constants.format_code_to_name[format_code]
-                format_converter = constants.format_name_to_converter[
-                    format_name]
-                unit_name = constants.unit_code_to_name[unit_code]
+                if not 0 <= format_code < len(constants.format_table) or \
+                        constants.format_table[format_code] is None:
+                    raise HapBleError(
+                        name="Unknown format code",
+                        message="Format code {}".format(format_code))
+                format_name, format_converter = constants.format_table[
+                    format_code]
+                unit_name = constants.lookup_unit_name(unit_code)
+                if unit_name is None:
+                    raise HapBleError(
+                        name="Unknown unit code",
+                        message="Unit code {}".format(unit_code))
                 new_attrs = {
                     'HAP_Format': format_name,
                     'HAP_Format_Converter': format_converter,
@@ -470,7 +551,7 @@ class HapCharacteristic:
             else:
                 new_attrs = {name: converter(bytes_)}
 
-            # Add new attributes
+            # Collect new attributes
             for key, val in new_attrs.items():
                 logger.debug("TLV found in response. %s: %s", key, val)
                 key = key.lower()
@@ -478,9 +559,12 @@ class HapCharacteristic:
                     logger.debug(
                         "Duplicate TLV Param Type found: %s. Appending.", key)
                     val = attributes[key] + val
-                setattr(self, key, val)
                 attributes[key] = val
 
+        # Set all of the attributes in one dict merge rather than one
+        # setattr per TLV entry.
+        self.__dict__.update(attributes)
+
         return attributes
 
 
@@ -502,11 +586,30 @@ class HapAccessory:
         self.peripheral = bluepy.btle.Peripheral()
         self._characteristics = {
         }  # type: Dict[str, bluepy.btle.Characteristic]
+        self._retry_cache = {}  # type: Dict[Tuple[int, int], tenacity.Retrying]
 
     def connect(self) -> None:
         """Connect to BLE peripheral."""
         self.peripheral.connect(self.address, self.address_type)
 
+    def tenacity_retry(self, max_attempts: int,
+                       wait_time: int) -> tenacity.Retrying:
+        """Return the retry decorator for this accessory.
+
+        All characteristics of an accessory share the same reconnect
+        callback, so the tenacity object is built once per
+        (max_attempts, wait_time) and cached rather than reconstructed
+        by every characteristic."""
+        try:
+            return self._retry_cache[(max_attempts, wait_time)]
+        except KeyError:
+            reconnect_callback = reconnect_callback_factory(
+                accessory=weakref.proxy(self))
+            retry = reconnect_tenacity_retry(reconnect_callback, max_attempts,
+                                             wait_time)
+            self._retry_cache[(max_attempts, wait_time)] = retry
+            return retry
+
     def charateristic(self, uuid: str) -> bluepy.btle.Characteristic:
         """Return the GATT characteristic for the given UUID."""
         if uuid not in self._characteristics:
@@ -523,9 +626,52 @@ class HapAccessory:
     def save_key(self) -> None:
         pass
 
+    # How many signature read requests to leave outstanding at once,
+    # to respect the accessory's procedure queue limits.
+    max_outstanding_requests = 16
+
     def discover_hap_characteristics(self) -> List[HapCharacteristic]:
-        """Discovers all of the HAP Characteristics and performs a signature read on each one."""
-        pass
+        """Discovers all of the HAP Characteristics and performs a signature read on each one.
+
+        The signature reads are pipelined: all of the requests in a batch
+        are written before any response is read, so that the BLE connection
+        interval is amortized over the batch instead of paid once per
+        characteristic."""
+        logger.debug("Discovering HAP characteristics.")
+        characteristics = []
+        for gatt_characteristic in self.peripheral.getCharacteristics():
+            if not gatt_characteristic.getDescriptors(
+                    constants.characteristic_ID_descriptor_UUID):
+                continue
+            uuid = str(gatt_characteristic.uuid)
+            self._characteristics[uuid] = gatt_characteristic
+            characteristics.append(
+                HapCharacteristic(accessory=self, uuid=uuid))
+
+        for start in range(0, len(characteristics),
+                           self.max_outstanding_requests):
+            batch = characteristics[start:
+                                    start + self.max_outstanding_requests]
+
+            # Write all of the signature read requests first.
+            headers = []
+            for characteristic in batch:
+                header = HapBlePduRequestHeader(
+                    cid_sid=characteristic.cid,
+                    op_code=_SIGNATURE_READ_OP_CODE)
+                characteristic._request(header)  # pylint: disable=W0212
+                headers.append(header)
+
+            # Then collect and parse all of the responses.
+            for characteristic, header in zip(batch, headers):
+                response = characteristic._read()  # pylint: disable=W0212
+                characteristic._check_read_response(  # pylint: disable=W0212
+                    request_header=header, response=response)
+                # pylint: disable=W0212
+                characteristic._signature = characteristic._parse_response(
+                    response)
+
+        return characteristics
 
     def get_characteristic(self, name: str, uuid: str) -> HapCharacteristic:
         pass
@@ -571,21 +717,35 @@ class HapAccessoryLock(HapAccessory):
         pass
 
 
-def reconnect_callback_factory(
-        accessory: HapAccessory) -> Callable[[Any, int], None]:
-    """Factory for creating tenacity before callbacks to reconnect to a peripheral."""
+class _ReconnectCallback:
+    """Tenacity before-callback that reconnects to an accessory.
+
+    A callable class rather than a closure: the accessory lives in a
+    slot instead of a cell, which is cheaper to load on every retry
+    attempt and avoids the per-instance dict."""
+
+    __slots__ = ('accessory', )
+
+    def __init__(self, accessory: HapAccessory) -> None:
+        self.accessory = accessory
 
     # pylint: disable=W0613
-    def reconnect(func: Any, trial_number: int) -> None:
+    def __call__(self, func: Any, trial_number: int) -> None:
         """Attempt to reconnect."""
         try:
             logger.debug("Attempting to reconnect to device.")
-            accessory.connect()
+            self.accessory.connect()
         except bluepy.btle.BTLEException:
             logger.debug(
                 "Error while attempting to reconnect to device", exc_info=True)
+        except ReferenceError:
+            logger.debug("Accessory no longer exists, cannot reconnect.")
+
 
-    return reconnect
+def reconnect_callback_factory(
+        accessory: HapAccessory) -> Callable[[Any, int], None]:
+    """Factory for creating tenacity before callbacks to reconnect to a peripheral."""
+    return _ReconnectCallback(accessory)
 
 
 def reconnect_tenacity_retry(reconnect_callback: Callable[[Any, int], Any],
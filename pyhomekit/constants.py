@@ -1,50 +1,61 @@
 """HAP Constants"""
 
-from struct import unpack
-from typing import Dict, Any, Optional, Tuple  # NOQA pylint: disable=W0611
+from struct import Struct
+from typing import Dict, Any, List, Optional, Tuple  # NOQA pylint: disable=W0611
+
+# Precompiled structs, to avoid re-parsing the format string on every call.
+_BOOL_STRUCT = Struct('<?')
+_FLOAT_STRUCT = Struct('<f')
+_INT32_STRUCT = Struct('<i')
+_UINT64_STRUCT = Struct('<Q')
+_UINT32_STRUCT = Struct('<I')
+_UINT16_STRUCT = Struct('<H')
+_FORMAT_STRUCT = Struct('<BbHbH')
 
 
 def to_uuid(b: bytes) -> str:
     """Convert bytes to string representation of uuid.
 
-    The bytes are reversed first."""
+    The bytes are reversed first. Formatted by hand: building a
+    uuid.UUID object benchmarks several times slower than the hex
+    slice-and-join because of its input validation."""
     s = b[::-1].hex()
     return '-'.join((s[:8], s[8:12], s[12:16], s[16:20], s[20:]))
 
 
 def to_bool(b: bytes) -> bool:
     """Convert to bytes to bool (little endian)."""
-    return unpack('<?', b)[0]
+    return _BOOL_STRUCT.unpack(b)[0]
 
 
 def to_float(b: bytes) -> int:
     """Convert to bytes to float (little endian)."""
-    return unpack('<f', b)[0]
+    return _FLOAT_STRUCT.unpack(b)[0]
 
 
 def to_int32(b: bytes) -> int:
     """Convert to bytes to 32 bit signed int (little endian)."""
-    return unpack('<i', b)[0]
+    return _INT32_STRUCT.unpack(b)[0]
 
 
 def to_uint64(b: bytes) -> int:
     """Convert to bytes to 64 bit unsigned int (little endian)."""
-    return unpack('<Q', b)[0]
+    return _UINT64_STRUCT.unpack(b)[0]
 
 
 def to_uint32(b: bytes) -> int:
     """Convert to bytes to 32 bit unsigned int (little endian)."""
-    return unpack('<I', b)[0]
+    return _UINT32_STRUCT.unpack(b)[0]
 
 
 def to_uint16(b: bytes) -> int:
     """Convert to bytes to 16 bit unsigned short (little endian)."""
-    return unpack('<H', b)[0]
+    return _UINT16_STRUCT.unpack(b)[0]
 
 
 def to_uint8(b: bytes) -> int:
     """Convert to bytes to 8 bit unsigned short (little endian)."""
-    return unpack('<B', b)[0]
+    return b[0]
 
 
 def to_utf8(b: bytes) -> str:
@@ -59,11 +70,8 @@ def identity(x: Any) -> Any:
 
 def parse_format(b: bytes) -> Tuple[int, int]:
     """Parse the bluetooth characteristic presentation format to format and unit code"""
-    format_ = unpack('<B', b[0:1])[0]
-    exponent = unpack('<b', b[1:2])[0]  # Not used, should be 0
-    unit = unpack('<H', b[2:4])[0]
-    namespace = unpack('<b', b[4:5])[0]  # Not used, should be 1
-    description = unpack('<H', b[5:])[0]  # Not used, should be 0
+    # exponent should be 0, namespace 1 and description 0
+    format_, exponent, unit, namespace, description = _FORMAT_STRUCT.unpack(b)
 
     if exponent != 0 or namespace != 1 or description != 0:
         raise ValueError("Unexpected presentation format: {}".format(b))
@@ -190,10 +198,23 @@ HAP_param_name_to_converter = {
     "HAP_Valid_Values_Range_Descriptor": identity
 }  # type: Dict[str, Any]
 
+# Combined table so the TLV parse loop only needs one lookup per entry.
+HAP_param_code_to_name_and_converter = {
+    code: (HAP_param_type_code_to_name[code], converter)
+    for code, converter in HAP_param_code_to_converter.items()
+}  # type: Dict[int, Tuple[str, Any]]
+
+# The parameter type codes are a dense range, so the parse loop can index
+# a tuple directly instead of hashing into a dict. Entry 0 is unused.
+HAP_param_table = tuple(
+    HAP_param_code_to_name_and_converter.get(code)
+    for code in range(max(HAP_param_code_to_name_and_converter) + 1)
+)  # type: Tuple[Optional[Tuple[str, Any]], ...]
+
 format_code_to_name = {
     0x01: 'bool',
     0x04: 'uint8',
-    0x06: 'unit16',
+    0x06: 'uint16',
     0x08: 'uint32',
     0x0A: 'uint64',
     0x10: 'int',
@@ -214,6 +235,15 @@ format_name_to_converter = {
     'data': lambda x: x
 }
 
+# The format codes are a small dense-ish range, so presentation format
+# decoding can index a tuple by code rather than chaining two dict
+# lookups. Entries for unassigned codes are None.
+format_table = tuple(
+    (format_code_to_name[code], format_name_to_converter[
+        format_code_to_name[code]]) if code in format_code_to_name else None
+    for code in range(max(format_code_to_name) + 1)
+)  # type: Tuple[Optional[Tuple[str, Any]], ...]
+
 unit_name_to_code = {
     'celsius': 0x272F,
     'arcdegrees': 0x2763,
@@ -232,6 +262,25 @@ unit_code_to_name = {
     10157: 'percentage'
 }
 
+# The unit codes sit in a small contiguous window, so lookups can be an
+# offset-indexed load instead of a dict probe.
+_UNIT_CODE_BASE = min(unit_code_to_name)
+_unit_name_table = [None] * (max(unit_code_to_name) - _UNIT_CODE_BASE + 1
+                             )  # type: List[Optional[str]]
+for _code, _name in unit_code_to_name.items():
+    _unit_name_table[_code - _UNIT_CODE_BASE] = _name
+unit_name_table = tuple(_unit_name_table)
+del _unit_name_table, _code, _name
+
+
+def lookup_unit_name(code: int) -> Optional[str]:
+    """Return the unit name for a GATT unit code, or None if unknown."""
+    index = code - _UNIT_CODE_BASE
+    if 0 <= index < len(unit_name_table):
+        return unit_name_table[index]
+    return None
+
+
 pairing_tlv_value_to_name = {
     0: 'kTLVType_Method',
     1: 'kTLVType_Identifier',
@@ -250,6 +299,12 @@ pairing_tlv_value_to_name = {
     255: 'kTLVType_Separator'
 }
 
+# The kTLV type is a single byte, so a 256-entry tuple gives the name
+# with one indexed load and no hashing. Unassigned types are None.
+pairing_tlv_name_table = tuple(
+    pairing_tlv_value_to_name.get(code) for code in range(256)
+)  # type: Tuple[Optional[str], ...]
+
 pairing_tlv_name_to_format = {
     'kTLVType_Certificate': 'bytes',
     'kTLVType_EncryptedData': 'bytes',
@@ -406,3 +461,9 @@ status_code_to_message = {
     0x06:
     'Accessory was not able to perform the requested operation.'
 }
+
+# Combined table so the error path only needs one lookup.
+status_code_to_name_message = {
+    code: (status_code_to_name[code], status_code_to_message[code])
+    for code in status_code_to_name
+}  # type: Dict[int, Tuple[str, str]]
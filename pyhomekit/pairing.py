@@ -11,19 +11,32 @@ https://tools.ietf.org/html/rfc2945
 
 import logging
 import os
-import random
+import secrets
 
+from functools import lru_cache
 from hashlib import sha512
-from hmac import compare_digest
+from hmac import compare_digest, new as hmac_new
 from struct import pack
 from typing import Any, Dict, List, Tuple, Union, Optional  # NOQA pylint: disable=W0611
 
-import cryptography.hazmat
 from libnacl import (crypto_aead_chacha20poly1305_ietf_decrypt,
                      crypto_aead_chacha20poly1305_ietf_encrypt)
 
 import ed25519
 
+try:
+    # gmpy2 is optional: GMP's modular exponentiation is several times
+    # faster than CPython's on the 3072-bit SRP operands.
+    from gmpy2 import powmod as _powmod
+    _HAVE_GMPY2 = True
+except ImportError:
+    _HAVE_GMPY2 = False
+
+    def _powmod(base: int, exp: int, mod: int) -> int:
+        """Fallback modular exponentiation when gmpy2 is unavailable."""
+        return pow(base, exp, mod)
+
+
 from . import constants, utils
 
 logger = logging.getLogger(__name__)
@@ -43,7 +56,7 @@ N_HEX = """FFFFFFFF FFFFFFFF C90FDAA2 2168C234 C4C6628B 80DC1CD1 29024E08
            1AD2EE6B F12FFA06 D98A0864 D8760273 3EC86A64 521F2B18 177B200C
            BBE11757 7A615D6C 770988C0 BAD946E2 08E24FA0 74E5AB31 43DB5BFC
            E0FD108E 4B82D120 A93AD2CA FFFFFFFF FFFFFFFF"""
-N = int(''.join(N_HEX.split()), 16)
+N = int.from_bytes(bytes.fromhex(''.join(N_HEX.split())), 'big')
 PAD_L = N.bit_length() // 8
 g = 5
 
@@ -56,6 +69,24 @@ password = ''
 
 def H(*args: Union[int, bytes, str], sep: bytes=b'', pad: bool=False) -> int:
     """Hash concatenated arguments"""
+    if pad and not sep:
+        # Write each argument right-aligned at a fixed offset in a single
+        # zero-filled buffer: the leading zeros are the padding, so no
+        # per-argument pad allocation or final join is needed.
+        buf = bytearray(PAD_L * len(args))
+        for i, arg in enumerate(args):
+            if isinstance(arg, int):
+                arg = to_bytes(arg, False)
+            elif isinstance(arg, str):
+                arg = arg.encode('utf-8')
+            if len(arg) > PAD_L:
+                raise ValueError(
+                    "Argument of {} bytes cannot be padded to {}".format(
+                        len(arg), PAD_L))
+            end = (i + 1) * PAD_L
+            buf[end - len(arg):end] = arg
+        return int.from_bytes(sha512(buf).digest(), 'big')
+
     # convert to bytes if necessary
     byte_args = []
     for arg in args:
@@ -66,47 +97,120 @@ def H(*args: Union[int, bytes, str], sep: bytes=b'', pad: bool=False) -> int:
         if pad:
             arg = b'\x00' * (PAD_L - len(arg)) + arg
         byte_args.append(arg)
-    return int(sha512(sep.join(byte_args)).hexdigest(), 16)
+    return int.from_bytes(sha512(sep.join(byte_args)).digest(), 'big')
 
 
 def random_int(n_bits: int=RANDOM_BITS) -> int:
-    """Generates a random int of n bytes, modulo N"""
-    return random.SystemRandom().getrandbits(n_bits) % N
+    """Generates a random int of n bits, uniform below N.
+
+    Byte-aligned sizes below N's bit length (the salt and exponent
+    cases) read the entropy with a single os.urandom call; anything
+    else falls back to rejection sampling, which avoids the small-value
+    bias a modulo reduction would introduce."""
+    if n_bits % 8 == 0 and n_bits < N.bit_length():
+        return int.from_bytes(os.urandom(n_bits // 8), 'big')
+    while True:
+        value = secrets.randbits(n_bits)
+        if value < N:
+            return value
 
 
 def to_bytes(value: int, little_endian: bool=False) -> bytes:
     """Transforms the int into bytes."""
-    if little_endian:
-        order = 'little'
-    else:
-        order = 'big'
-    return value.to_bytes(-(-value.bit_length() // 8), order)
+    return value.to_bytes((value.bit_length() + 7) // 8,
+                          'little' if little_endian else 'big')
 
 
 def from_bytes(value: bytes, little_endian: bool=False) -> int:
     """Transform bytes representation of an int into an int."""
-    if little_endian:
-        order = 'little'
-    else:
-        order = 'big'
-    return int.from_bytes(value, order)
+    return int.from_bytes(value, 'little' if little_endian else 'big')
+
+
+# Padded big-endian forms of the fixed group parameters, computed once so
+# k does not pay an int-to-bytes conversion plus padding per use.
+_N_PADDED = N.to_bytes(PAD_L, 'big')
+_G_PADDED = g.to_bytes(PAD_L, 'big')
+
+k = H(_N_PADDED, _G_PADDED)
+
+# Hashes of the fixed SRP parameters, computed once at import. M1 needs
+# H(N) ^ H(g) and H(USERNAME) on every M3 otherwise.
+_H_N = H(N)
+_H_G = H(g)
+_H_N_XOR_H_G = _H_N ^ _H_G
+_H_USERNAME = H(USERNAME)
+
+# SHA-512 context preloaded with the constant "Pair-Setup:" prefix of the
+# inner x hash; copying the context is a small memcpy, cheaper than
+# re-hashing the prefix every time.
+_USERNAME_PREFIX_CTX = sha512(USERNAME.encode('utf-8') + b':')
+
+
+# Powers g^(2^i) mod N for the fixed base g, built lazily on the first
+# fixed-base exponentiation.
+_g_pow_table = None  # type: Optional[List[int]]
+
+
+def _g_powmod(exp: int) -> int:
+    """Fixed-base exponentiation g^exp mod N.
+
+    With gmpy2 available GMP's sliding-window powmod is already fast.
+    Otherwise a table of g^(2^i) mod N is precomputed once, so each
+    exponentiation is only multiplications for the set bits of the
+    exponent, with no squarings."""
+    if _HAVE_GMPY2:
+        return int(_powmod(g, exp, N))
+
+    global _g_pow_table  # pylint: disable=W0603
+    if _g_pow_table is None:
+        table = []
+        value = g % N
+        for _ in range(N.bit_length()):
+            table.append(value)
+            value = value * value % N
+        _g_pow_table = table
 
+    result = 1
+    bit = 0
+    while exp:
+        if exp & 1:
+            result = result * _g_pow_table[bit] % N
+        exp >>= 1
+        bit += 1
+    return result
 
-k = H(N, g, pad=True)
+
+@lru_cache(maxsize=8)
+def _srp_client_secret(s: int, setup_code: str) -> Tuple[int, int]:
+    """Compute x and g^x mod N for a salt and setup code.
+
+    Memoized so retries with the same salt and setup code (typos,
+    retransmits) skip the 3072-bit modular exponentiation."""
+    inner_ctx = _USERNAME_PREFIX_CTX.copy()
+    inner_ctx.update(setup_code.encode('utf-8'))
+    x = H(s, int.from_bytes(inner_ctx.digest(), 'big'))
+    return x, _g_powmod(x)
 
 
 def derive_session_key(shared_secret: bytes,
                        salt: bytes=b"Pair-Setup-Controller-Sign-Salt",
                        info: bytes=b"Pair-Setup-Controller-Sign-Info",
                        output_size: int=32) -> bytes:
-    """Derive X from the SRP shared secret by using HKDF-SHA-512."""
-    hkdf = cryptography.hazmat.primitives.kdf.hkdf.HKDF(
-        algorithm=cryptography.hazmat.primitives.hashes.SHA512(),
-        length=output_size,
-        salt=salt,
-        info=info,
-        backend=cryptography.hazmat.backends.default_backend())
-    return hkdf.derive(shared_secret)
+    """Derive X from the SRP shared secret by using HKDF-SHA-512.
+
+    HKDF (RFC 5869) implemented over the standard library HMAC, which
+    skips the per-derivation backend and context setup of the
+    cryptography package's HKDF class."""
+    prk = hmac_new(salt, shared_secret, sha512).digest()
+    okm = b''
+    block = b''
+    counter = 1
+    while len(okm) < output_size:
+        block = hmac_new(prk, block + info + bytes([counter]),
+                         sha512).digest()
+        okm += block
+        counter += 1
+    return okm[:output_size]
 
 
 class SRPPairSetup:
@@ -132,6 +236,13 @@ class SRPPairSetup:
         This folder should be secure to prevent unauthorized access.
     """
 
+    __slots__ = ('setup_code', 'pairing_id', 'storage_folder', 'g', 'N', 'k',
+                 'B', 's', 'my_s', 'x', 'a', 'A', 'u', 'S', 'K', 'M1', 'M2',
+                 'X', 'state', '_session_key', 'signing_key',
+                 'verifying_key', 'device_info',
+                 'device_signature', 'accessory_pairing_id', 'accessory_ltpk',
+                 'accessory_signature')
+
     def __init__(
             self,
             pairing_id: bytes,
@@ -143,7 +254,7 @@ class SRPPairSetup:
 
         self.g = g
         self.N = N
-        self.k = H(self.N, self.g, pad=True)
+        self.k = k
         self.B = 0  # type: int
         self.s = 0  # type: int
         self.my_s = 0  # type: int
@@ -157,6 +268,7 @@ class SRPPairSetup:
         self.M2 = 0  # type: int
         self.X = 0  # type: int
         self.state = 0
+        self._session_key = None  # type: Optional[bytes]
         self.signing_key = None  # type: Optional[ed25519.SigningKey]
         self.verifying_key = None  # type: Optional[ed25519.VerifyingKey]
         self.device_info = b''  # type: bytes
@@ -165,6 +277,20 @@ class SRPPairSetup:
         self.accessory_ltpk = b''  # type: bytes
         self.accessory_signature = b''  # type: bytes
 
+    @property
+    def session_key(self) -> bytes:
+        """32 byte ChaCha20-Poly1305 key derived from the SRP shared secret.
+
+        Derived once per session; passing the raw SRP secret to libnacl
+        would be both wrong per the HAP spec and force an int to bytes
+        coercion on every encrypt."""
+        if self._session_key is None:
+            self._session_key = derive_session_key(
+                to_bytes(self.S),
+                salt=b"Pair-Setup-Encrypt-Salt",
+                info=b"Pair-Setup-Encrypt-Info")
+        return self._session_key
+
     @staticmethod
     def m1_generate_srp_start_request() -> List[Tuple[int, bytes]]:
         """Generate the SRP Start request message TLVs.
@@ -186,7 +312,7 @@ class SRPPairSetup:
     def m2_receive_srp_start_response(self,
                                       parsed_ktlvs: Dict[str, bytes]) -> None:
         """Update SRP session with m2 response"""
-        if from_bytes(parsed_ktlvs['kTLVType_State'], False) != 2:
+        if parsed_ktlvs['kTLVType_State'][0] != 2:
             raise ValueError(
                 "Received wrong message for M2 {}".format(parsed_ktlvs))
         self.B = from_bytes(parsed_ktlvs['kTLVType_PublicKey'])
@@ -212,16 +338,17 @@ class SRPPairSetup:
             self.setup_code = setup_code
         if self.setup_code is None:
             raise ValueError("No setup code, cannot proceed with M3")
-        self.x = H(self.s, H(USERNAME, self.setup_code, sep=b":"))
+        self.x, g_x = _srp_client_secret(self.s, self.setup_code)
         self.a = random_int(RANDOM_BITS)
-        self.A = pow(self.g, self.a, self.N)
+        self.A = int(_powmod(self.g, self.a, self.N))
 
         self.u = H(self.A, self.B, pad=True)
-        self.S = pow(self.B - (self.k * pow(self.g, self.x, self.N)),
-                     self.a + (self.u * self.x), self.N)
+        self.S = int(
+            _powmod(self.B - (self.k * g_x),
+                    self.a + (self.u * self.x), self.N))
         self.K = H(self.S)
         # self.M1 = H(self.A, self.B, self.S)
-        self.M1 = H(H(N) ^ H(g), H(USERNAME), self.s, self.A, self.B, self.K)
+        self.M1 = H(_H_N_XOR_H_G, _H_USERNAME, self.s, self.A, self.B, self.K)
 
         ktlvs = [(constants.PairingKTlvValues.kTLVType_State, pack('<B', 3)),
                  (constants.PairingKTlvValues.kTLVType_PublicKey,
@@ -234,7 +361,7 @@ class SRPPairSetup:
     def m4_receive_srp_verify_response(self,
                                        parsed_ktlvs: Dict[str, bytes]) -> None:
         """Verify accessory's proof."""
-        if from_bytes(parsed_ktlvs['kTLVType_State'], False) != 4:
+        if parsed_ktlvs['kTLVType_State'][0] != 4:
             raise ValueError(
                 "Received wrong message for M4 {}".format(parsed_ktlvs))
         self.M2 = from_bytes(parsed_ktlvs['kTLVType_Proof'])
@@ -268,27 +395,18 @@ class SRPPairSetup:
                       "wb") as secret_key_file:
                 secret_key_file.write(self.signing_key.to_bytes())
         self.verifying_key = self.signing_key.get_verifying_key()
+        verifying_key_bytes = self.verifying_key.to_bytes()
 
         # 2. Derive iOSDeviceX from the SRP shared secret by using HKDF-SHA-512
-        salt = b"Pair-Setup-Controller-Sign-Salt"
-        info = b"Pair-Setup-Controller-Sign-Info"
-        output_size = 32
-
-        hkdf = cryptography.hazmat.primitives.kdf.hkdf.HKDF(
-            algorithm=cryptography.hazmat.primitives.hashes.SHA512(),
-            length=output_size,
-            salt=salt,
-            info=info,
-            backend=cryptography.hazmat.backends.default_backend())
-        self.X = hkdf.derive(to_bytes(self.K))
+        self.X = derive_session_key(to_bytes(self.K))
 
         # 3. Concatenate iOSDeviceX with the iOS device's Pairing Identifier, iOSDevicePairingID,
         # and its long-term public key, iOSDeviceLTPK.
         # The concatenated value will be referred to as iOSDeviceInfo.
 
         self.device_info = (
-            to_bytes(self.X) + session.pairing_id.encode('utf-8') +
-            self.verifying_key.to_bytes())
+            to_bytes(self.X) + self.pairing_id.encode('utf-8') +
+            verifying_key_bytes)
 
         # 4. Generate iOSDeviceSignature by signing iOSDeviceInfo with its
         # long-term secret key, iOSDeviceLTSK, using Ed25519.
@@ -299,19 +417,21 @@ class SRPPairSetup:
         sub_ktlvs = [(constants.PairingKTlvValues.kTLVType_Identifier,
                       self.pairing_id),
                      (constants.PairingKTlvValues.kTLVType_PublicKey,
-                      self.verifying_key.to_bytes()),
+                      verifying_key_bytes),
                      (constants.PairingKTlvValues.kTLVType_Signature,
                       self.device_signature)]
 
-        prepared_sub_ktlvs = b''.join(
-            data for ktlv in sub_ktlvs for data in utils.prepare_tlv(*ktlv))
+        prepared_sub_ktlvs = utils.prepare_tlvs(sub_ktlvs)
 
         # 6. Encrypt the sub-TLV, encryptedData, and generate the 16 byte auth tag, authTag.
         # using the ChaCha20-Poly1305 AEAD algorithm
 
         # this includes the auth_tag appended at the end
         encrypted_data = crypto_aead_chacha20poly1305_ietf_encrypt(
-            key=self.S, nonce="PS-Msg05", aad=None, message=prepared_sub_ktlvs)
+            key=self.session_key,
+            nonce=b"\x00\x00\x00\x00PS-Msg05",
+            aad=b'',
+            message=prepared_sub_ktlvs)
 
         ktlvs = [(constants.PairingKTlvValues.kTLVType_State, pack('<B', 5)),
                  (constants.PairingKTlvValues.kTLVType_EncryptedData,
@@ -322,15 +442,15 @@ class SRPPairSetup:
     def m6_receive_exchange_response(self,
                                      parsed_ktlvs: Dict[str, int]) -> None:
         """Verify accessory and save pairing."""
-        if parsed_ktlvs['kTLVType_State'] != 6:
+        if parsed_ktlvs['kTLVType_State'][0] != 6:
             raise ValueError(
                 "Received wrong message for M6 {}".format(parsed_ktlvs))
 
         decrypted_ktlvs = crypto_aead_chacha20poly1305_ietf_decrypt(
             parsed_ktlvs['kTLVType_EncryptedData'],
-            nonce=b"PS-Msg06",
-            aad=None,
-            key=self.S)
+            nonce=b"\x00\x00\x00\x00PS-Msg06",
+            aad=b'',
+            key=self.session_key)
 
         parsed_decrypted_ktlvs = utils.parse_ktlvs(decrypted_ktlvs)
 
@@ -374,6 +494,11 @@ class SRPPairVerify:
         This folder should be secure to prevent unauthorized access.
     """
 
+    __slots__ = ('setup_code', 'pairing_id', 'storage_folder', 'secret_key',
+                 'verifying_key', '_verifying_key_bytes', 'device_info',
+                 'device_signature', 'accessory_pairing_id', 'accessory_ltpk',
+                 'accessory_signature')
+
     def __init__(
             self,
             pairing_id: bytes,
@@ -385,12 +510,26 @@ class SRPPairVerify:
 
         self.secret_key = None  # type: Optional[ed25519.SigningKey]
         self.verifying_key = None  # type: Optional[ed25519.VerifyingKey]
+        self._verifying_key_bytes = None  # type: Optional[bytes]
         self.device_info = b''  # type: bytes
         self.device_signature = b''  # type: bytes
         self.accessory_pairing_id = b''  # type: bytes
         self.accessory_ltpk = b''  # type: bytes
         self.accessory_signature = b''  # type: bytes
 
+    def _ensure_keys(self) -> None:
+        """Load the long term keys from storage, once.
+
+        Key import recomputes the public key from the secret scalar, so
+        repeated m1 calls reuse the already loaded keys."""
+        if self.secret_key is not None:
+            return
+        with open(os.path.join(self.storage_folder, "secret-key"),
+                  "rb") as secret_key_file:
+            self.secret_key = ed25519.SigningKey(secret_key_file.read())
+        self.verifying_key = self.secret_key.get_verifying_key()
+        self._verifying_key_bytes = self.verifying_key.to_bytes()
+
     def m1_generate_verify_start_request(self) -> List[Tuple[int, bytes]]:
         """Generate the SRP Start request message TLVs.
 
@@ -402,17 +541,13 @@ class SRPPairVerify:
         - kTLVType_State <M1>
         - kTLVType_PublicKey <Curve25519 public key>
         """
-        with open(os.path.join(self.storage_folder, "secret-key"),
-                  "rb") as secret_key_file:
-            self.secret_key = ed25519.SigningKey(secret_key_file.read())
-        self.verifying_key = self.secret_key.get_verifying_key()
+        self._ensure_keys()
 
         ktlvs = [(constants.PairingKTlvValues.kTLVType_State, pack('<B', 1)),
                  (constants.PairingKTlvValues.kTLVType_PublicKey,
-                  self.verifying_key.to_bytes())]
+                  self._verifying_key_bytes)]
 
-        prepared_ktlvs = b''.join(
-            data for ktlv in ktlvs for data in utils.prepare_tlv(*ktlv))
+        prepared_ktlvs = utils.prepare_tlvs(ktlvs)
 
         message_data = [(constants.HapParamTypes.Return_Response, pack(
             '<B', 1)), (constants.HapParamTypes.Value, prepared_ktlvs)]
@@ -422,7 +557,7 @@ class SRPPairVerify:
     @staticmethod
     def m2_receive_start_response(parsed_ktlvs: Dict[str, bytes]) -> None:
         """Update SRP session with m2 response"""
-        if from_bytes(parsed_ktlvs['kTLVType_State']) != 2:
+        if parsed_ktlvs['kTLVType_State'][0] != 2:
             raise ValueError(
                 "Received wrong message for M2 {}".format(parsed_ktlvs))
         proof = from_bytes(parsed_ktlvs['kTLVType_PublicKey'])
@@ -455,9 +590,11 @@ def pair() -> None:
     # kTLVType_State <M3>
     # kTLVType_PublicKey <iOS device's SRP public key> - A
     # kTLVType_Proof <iOS device's SRP proof> - M1
-    my_s = random_int(SALT_BITS)
+    # One urandom read covers both the salt and the ephemeral exponent.
+    entropy = os.urandom((SALT_BITS + RANDOM_BITS) // 8)
+    my_s = int.from_bytes(entropy[:SALT_BITS // 8], 'big')
+    a = int.from_bytes(entropy[SALT_BITS // 8:], 'big')
     x = H(my_s, H(USERNAME, password, sep=b":"))
-    a = random_int(RANDOM_BITS)
     A = pow(g, a, N)
 
     u = H(A, B, pad=True)
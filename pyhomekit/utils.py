@@ -2,27 +2,34 @@
 
 import logging
 
-from struct import pack
-from typing import (Any, Callable, Dict, List)  # NOQA pylint: disable=W0611
+from struct import Struct
+from typing import (Any, Callable, Dict, List, Sequence)  # NOQA pylint: disable=W0611
 from typing import (Tuple, Union, Optional, Iterator)  # NOQA pylint: disable=W0611
 
 from . import constants
 
 logger = logging.getLogger(__name__)
 
+# Precompiled TLV header struct, shared by the serialization helpers.
+_TLV_HEADER_STRUCT = Struct('<BB')
 
-def iterate_tvl(response: bytes) -> Iterator[Tuple[int, int, bytes]]:
-    """Iterate through response bytes, 1 tlv at a time."""
-    start = 0
-    end = 0
-    while end < len(response):
-        # First byte indidates type
-        body_type = response[start]
-        # Next byte indicates length
-        length = response[start + 1]
-        yield body_type, length, response[start + 2:start + 2 + length]
-        start += 2 + length
-        end += 2 + length
+
+def iterate_tvl(response: bytes) -> Iterator[Tuple[int, int, memoryview]]:
+    """Iterate through response bytes, 1 tlv at a time.
+
+    The values are yielded as memoryview slices into the response, so
+    no payload bytes are copied; callers materialize with bytes() where
+    they need to hold on to a value."""
+    view = memoryview(response)
+    total = len(view)
+    offset = 0
+    while offset < total:
+        # First byte indidates type, next byte the length
+        body_type = view[offset]
+        length = view[offset + 1]
+        offset += 2
+        yield body_type, length, view[offset:offset + length]
+        offset += length
 
 
 def prepare_tlv(param_type: int, value: bytes) -> Iterator[bytes]:
@@ -36,12 +43,65 @@ def prepare_tlv(param_type: int, value: bytes) -> Iterator[bytes]:
     value
         The value in bytes of the parameter.
     """
-    first = True  # should yield something even when value is empty
-    while value or first:
-        first = False
-        fragment = value[:255]
-        yield pack('<BB', param_type, len(fragment)) + fragment
-        value = value[255:]
+    if len(value) <= 255:
+        # Single fragment (or empty value, which still yields a header)
+        yield _TLV_HEADER_STRUCT.pack(param_type, len(value)) + value
+        return
+
+    # Walking a memoryview by offset avoids reallocating the shrinking
+    # tail slice on every fragment; header and payload are written into
+    # one preallocated buffer instead of concatenated.
+    view = memoryview(value)
+    total = len(view)
+    offset = 0
+    while offset < total:
+        chunk = min(255, total - offset)
+        buf = bytearray(2 + chunk)
+        # Two direct byte stores beat Struct.pack_into for a 2 byte
+        # header.
+        buf[0] = param_type
+        buf[1] = chunk
+        buf[2:] = view[offset:offset + chunk]
+        yield bytes(buf)
+        offset += chunk
+
+
+def prepare_tlvs(tlvs: Sequence[Tuple[int, bytes]]) -> bytes:
+    """Serialize TLVs into a single buffer.
+
+    The exact output size is computed up front so the whole PDU body is
+    written into a single preallocated buffer, instead of growing a
+    bytearray fragment by fragment.
+
+    Parameters
+    ----------
+    tlvs
+        Sequence of (param type, value) pairs.
+    """
+    total = 0
+    for _, value in tlvs:
+        # Each 255-byte fragment carries a 2 byte header; an empty
+        # value is still one header.
+        total += 2 * max(1, (len(value) + 254) // 255) + len(value)
+
+    buf = bytearray(total)
+    pos = 0
+    for param_type, value in tlvs:
+        length = len(value)
+        if length == 0:
+            buf[pos] = param_type
+            buf[pos + 1] = 0
+            pos += 2
+            continue
+        view = memoryview(value)
+        for offset in range(0, length, 255):
+            chunk = min(255, length - offset)
+            buf[pos] = param_type
+            buf[pos + 1] = chunk
+            pos += 2
+            buf[pos:pos + chunk] = view[offset:offset + chunk]
+            pos += chunk
+    return bytes(buf)
 
 
 def parse_ktlvs(data: bytes) -> Dict[str, Any]:
@@ -51,19 +111,34 @@ def parse_ktlvs(data: bytes) -> Dict[str, Any]:
     for body_type, length, bytes_ in iterate_tvl(data):
         if len(bytes_) != length:
             raise HapBleError(name="Invalid response length")
-        name = constants.PairingKTlvValues()(body_type)
-        if name in attributes:
+        name = constants.pairing_tlv_name_table[body_type]
+        if name is None:
+            raise HapBleError(
+                name="Unknown kTLV type",
+                message="kTLV type code {}".format(body_type))
+        fragments = attributes.get(name)
+        if fragments is None:
+            attributes[name] = [bytes_]
+        else:
             logger.debug("Duplicate kTLV Value found: %s. Appending.", name)
-            bytes_ = attributes[name] + bytes_
-        attributes[name] = bytes_
-        logger.debug("TLV found in response. %s: %s", name, bytes_)
+            fragments.append(bytes_)
+        logger.debug("TLV found in response. %s: %s", name, bytes(bytes_))
 
-    return attributes
+    # Materialize each value once, joining any fragments.
+    return {
+        name: fragments[0].tobytes()
+        if len(fragments) == 1 else b''.join(fragments)
+        for name, fragments in attributes.items()
+    }
 
 
 class HapBleError(Exception):
     """HAP Error."""
 
+    # Bound at class level so construction skips the module attribute
+    # lookup on constants.
+    _status_code_table = constants.status_code_to_name_message
+
     def __init__(self,
                  status_code: int=None,
                  name: str=None,
@@ -87,11 +162,10 @@ class HapBleError(Exception):
             self.message = message
         else:
             self.status_code = status_code
-            self.name = constants.status_code_to_name[status_code]
-            self.message = constants.status_code_to_message[status_code]
+            self.name, self.message = self._status_code_table[status_code]
 
         super(HapBleError, self).__init__(name, message, *args)
 
     def __str__(self) -> str:
         """Return formatted error."""
-        return "{}: {}".format(self.name, self.message)
+        return f"{self.name}: {self.message}"
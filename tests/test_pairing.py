@@ -1,4 +1,4 @@
-from pyhomekit.pairing import H, N, g
+from pyhomekit.pairing import H, N, derive_session_key, g
 
 # N_HEX = """FFFFFFFF FFFFFFFF C90FDAA2 2168C234 C4C6628B 80DC1CD1 29024E08
 #            8A67CC74 020BBEA6 3B139B22 514A0879 8E3404DD EF9519B3 CD3A431B
@@ -109,3 +109,35 @@ def test_SRP_test_vectors():
     K_calc = H(S)
     assert K_calc == K
     M1 = H(H(N) ^ H(g), H(test_username), s, A, B, K)
+
+
+# HKDF-SHA-512 known answers for derive_session_key, generated with the
+# cryptography package's HKDF class before it was dropped as a
+# dependency. Input key material is bytes(range(64)).
+hkdf_sign_hex = """0466A0BF 8CE2BAAA 4DCF7797 775DB7F1 C3040E75 F035338E
+                   97DE03EB 2033FCC4"""
+
+hkdf_encrypt_hex = """B6335536 162D6629 E4C0BADE 85F1B712 C85A364B AB0DEDB2
+                      5014CFB8 14489273"""
+
+# 100 bytes of output, so the Expand loop runs into its second block.
+hkdf_sign_100_hex = """0466A0BF 8CE2BAAA 4DCF7797 775DB7F1 C3040E75 F035338E
+                       97DE03EB 2033FCC4 9DCB0781 38EAC148 9DBE6822 F66FEBA1
+                       CBFC7E23 C9E2FF1E 7255E7AB C4BC0021 3FE79423 169B2262
+                       2D0A69CE 43FF5FCE E64707D9 03654119 E212C47F 67070AC3
+                       DF44714F"""
+
+
+def hex_to_bytes(hex_str: str) -> bytes:
+    return bytes.fromhex(''.join(hex_str.split()))
+
+
+def test_derive_session_key_known_answers():
+    secret = bytes(range(64))
+    assert derive_session_key(secret) == hex_to_bytes(hkdf_sign_hex)
+    assert derive_session_key(
+        secret,
+        salt=b"Pair-Setup-Encrypt-Salt",
+        info=b"Pair-Setup-Encrypt-Info") == hex_to_bytes(hkdf_encrypt_hex)
+    assert derive_session_key(
+        secret, output_size=100) == hex_to_bytes(hkdf_sign_100_hex)